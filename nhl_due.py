@@ -4,10 +4,23 @@ Daily NHL goal scoring due tracker.
 from __future__ import annotations
 
 import dataclasses
-from datetime import date, datetime
-from typing import Dict, Iterable, List, Optional
+import functools
+import json
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+from typing import Dict, List, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:  # orjson is an optional, faster drop-in for decoding API payloads.
+    import orjson as _json
+except ImportError:  # pragma: no cover - depends on the environment
+    import json as _json
 
 
 SEASONS_API = "https://statsapi.web.nhl.com/api/v1/seasons"
@@ -15,9 +28,28 @@ SKATER_SUMMARY_API = "https://api.nhle.com/stats/rest/en/skater/summary"
 PLAYER_GAMELOG_API = "https://api.nhle.com/stats/rest/en/player/summary"
 SCHEDULE_API = "https://statsapi.web.nhl.com/api/v1/schedule"
 
+# Season metadata changes a couple of times a year, so it is reused across
+# runs for a day before being fetched again.
+SEASONS_CACHE_PATH = Path.home() / ".cache" / "morgoals" / "seasons.json"
+SEASONS_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Upper bound on in-flight requests; also sizes the per-host connection pool.
+MAX_WORKERS = 16
 
-@dataclasses.dataclass
+
+# __slots__ is spelled out rather than using slots=True so the script keeps
+# running on the Python 3.9 that ships with macOS.
+@dataclasses.dataclass(frozen=True)
 class PlayerBaseline:
+    __slots__ = (
+        "player_id",
+        "name",
+        "team_id",
+        "team_abbrev",
+        "goals",
+        "games_played",
+    )
+
     player_id: int
     name: str
     team_id: int
@@ -32,8 +64,17 @@ class PlayerBaseline:
         return self.goals / self.games_played
 
 
-@dataclasses.dataclass
+@dataclasses.dataclass(frozen=True)
 class PlayerDueStatus:
+    __slots__ = (
+        "player",
+        "last_goal_date",
+        "days_since_last_goal",
+        "expected_days_between_goals",
+        "next_game_opponent",
+        "next_game_start_time",
+    )
+
     player: PlayerBaseline
     last_goal_date: date
     days_since_last_goal: int
@@ -42,38 +83,129 @@ class PlayerDueStatus:
     next_game_start_time: str
 
 
+@dataclasses.dataclass(frozen=True)
+class ScheduledGame:
+    __slots__ = ("opponent", "start_time")
+
+    opponent: str
+    start_time: str
+
+
 class NhlApiError(RuntimeError):
     """Raised when the NHL API responds with a non-200 status."""
 
 
+def _http_session() -> requests.Session:
+    session = requests.Session()
+    retry = Retry(
+        total=3,
+        backoff_factor=1,
+        status_forcelist=(429, 500, 502, 503, 504),
+        # Hand the final bad response back so _get_json raises NhlApiError.
+        raise_on_status=False,
+    )
+    # One keep-alive pool per API host; workers wait for a pooled connection
+    # rather than opening extra ones that would be thrown away afterwards.
+    adapter = HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=MAX_WORKERS,
+        pool_block=True,
+        max_retries=retry,
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+SESSION = _http_session()
+
+
 def _get_json(url: str) -> Dict:
-    response = requests.get(url, timeout=20)
+    response = SESSION.get(url, timeout=20)
     if not response.ok:
         raise NhlApiError(f"Failed to fetch {url}: {response.status_code}")
-    return response.json()
+    return _json.loads(response.content)
+
+
+def _load_seasons_cache() -> Dict:
+    try:
+        cache = json.loads(SEASONS_CACHE_PATH.read_text())
+    except (OSError, ValueError):
+        return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def _is_fresh(entry: object, now: float) -> bool:
+    if not isinstance(entry, dict):
+        return False
+    fetched_at = entry.get("fetched_at")
+    if not isinstance(fetched_at, (int, float)):
+        return False
+    # A timestamp from the future (clock change, hand-edited file) is stale.
+    return 0 <= now - fetched_at <= SEASONS_CACHE_TTL_SECONDS
+
+
+def _read_seasons_cache(key: str) -> object:
+    # Each entry carries its own fetch time, so storing one key never
+    # extends the life of another.
+    entry = _load_seasons_cache().get(key)
+    return entry.get("value") if _is_fresh(entry, time.time()) else None
+
+
+def _store_seasons_cache(key: str, value: object) -> None:
+    now = time.time()
+    cache = {
+        cached_key: entry
+        for cached_key, entry in _load_seasons_cache().items()
+        if _is_fresh(entry, now)
+    }
+    cache[key] = {"fetched_at": now, "value": value}
+    try:
+        SEASONS_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        SEASONS_CACHE_PATH.write_text(json.dumps(cache))
+    except OSError:
+        pass  # Caching is best-effort; a read-only home should not fail the run.
 
 
+@functools.lru_cache(maxsize=4)
 def get_current_season_id() -> str:
+    cached = _read_seasons_cache("current")
+    if isinstance(cached, str) and cached:
+        return cached
     data = _get_json(f"{SEASONS_API}/current")
-    return data["seasons"][0]["seasonId"]
+    season_id = data["seasons"][0]["seasonId"]
+    _store_seasons_cache("current", season_id)
+    return season_id
 
 
 def get_previous_season_id(current_season_id: str) -> str:
     return str(int(current_season_id) - 1)
 
 
+@functools.lru_cache(maxsize=4)
 def get_season_dates(season_id: str) -> Dict[str, str]:
+    cached = _read_seasons_cache(season_id)
+    if (
+        isinstance(cached, dict)
+        and "regularSeasonStart" in cached
+        and "regularSeasonEnd" in cached
+    ):
+        return cached
     data = _get_json(f"{SEASONS_API}/{season_id}")
     season_info = data["seasons"][0]
-    return {
+    season_dates = {
         "regularSeasonStart": season_info["regularSeasonStartDate"],
         "regularSeasonEnd": season_info["regularSeasonEndDate"],
     }
+    _store_seasons_cache(season_id, season_dates)
+    return season_dates
 
 
 def fetch_top_goal_scorers(season_id: str, min_goals: int = 40) -> List[PlayerBaseline]:
     params = "?isAggregate=false&isGame=false&reportName=skatersummary&cayenneExp="
     params += f"seasonId={season_id} and gameTypeId=2"
+    # Stat-column filters belong in factCayenneExp, as on the stats site; it
+    # lets the API drop skaters below the threshold before sending them.
+    params += f"&factCayenneExp=goals>={min_goals}"
     url = f"{SKATER_SUMMARY_API}{params}"
     data = _get_json(url)
     players = []
@@ -104,13 +236,22 @@ def fetch_player_gamelog(player_id: int, season_id: str) -> List[Dict]:
     return data.get("data", [])
 
 
-def fetch_schedule_for_range(team_id: int, start: date, end: date) -> List[Dict]:
-    url = (
-        f"{SCHEDULE_API}?teamId={team_id}&startDate={start.isoformat()}"
-        f"&endDate={end.isoformat()}"
-    )
+def fetch_league_schedule_for_range(start: date, end: date) -> Dict[int, List[date]]:
+    """Return game dates between ``start`` and ``end`` keyed by team id."""
+    url = f"{SCHEDULE_API}?startDate={start.isoformat()}&endDate={end.isoformat()}"
     data = _get_json(url)
-    return data.get("dates", [])
+    per_team: Dict[int, List[date]] = defaultdict(list)
+    for date_block in data.get("dates", []):
+        if "date" not in date_block:
+            continue
+        game_date = _parse_date(date_block["date"])
+        for game in date_block.get("games", []):
+            teams = game.get("teams", {})
+            for side in ("home", "away"):
+                team = teams.get(side, {}).get("team")
+                if team:
+                    per_team[team.get("id")].append(game_date)
+    return dict(per_team)
 
 
 def fetch_schedule_for_day(target_date: date) -> Dict:
@@ -118,114 +259,128 @@ def fetch_schedule_for_day(target_date: date) -> Dict:
     return _get_json(url)
 
 
-def _parse_date(date_str: str) -> date:
-    return datetime.strptime(date_str, "%Y-%m-%d").date()
-
-
-def _extract_schedule_dates(schedule: Iterable[Dict]) -> List[date]:
-    dates: List[date] = []
-    for block in schedule:
-        try:
-            dates.append(_parse_date(block["date"]))
-        except KeyError:
-            continue
-    return dates
+# The API's YYYY-MM-DD dates are exactly what the C-level parser expects.
+_parse_date = date.fromisoformat
 
 
 def average_days_between_games(dates: List[date]) -> float:
     if len(dates) < 2:
         return 0.0
-    sorted_dates = sorted(dates)
-    deltas = [
-        (later - earlier).days
-        for earlier, later in zip(sorted_dates, sorted_dates[1:])
-    ]
-    return sum(deltas) / len(deltas)
+    # The gaps between consecutive sorted dates sum to the overall span, so
+    # their mean needs neither a sort nor the intermediate timedeltas.
+    return (max(dates) - min(dates)).days / (len(dates) - 1)
 
 
 def last_goal_date(game_log: List[Dict]) -> Optional[date]:
-    goal_games = [
-        _parse_date(entry["gameDate"])
-        for entry in game_log
-        if int(entry.get("goals", 0)) > 0
-    ]
-    return max(goal_games) if goal_games else None
+    # ISO dates sort the same as strings, so only the winner gets parsed.
+    latest = max(
+        (entry["gameDate"] for entry in game_log if int(entry.get("goals", 0)) > 0),
+        default=None,
+    )
+    return _parse_date(latest) if latest else None
 
 
 def games_played_dates(game_log: List[Dict]) -> List[date]:
     return [_parse_date(entry["gameDate"]) for entry in game_log]
 
 
-def _next_game_for_team(schedule_today: Dict, team_id: int) -> Optional[Dict]:
-    for date_block in schedule_today.get("dates", []):
+def _index_games_by_team(schedule: Dict) -> Dict[int, ScheduledGame]:
+    """Map each team in a day's schedule to its first game that day."""
+    by_team: Dict[int, ScheduledGame] = {}
+    for date_block in schedule.get("dates", []):
         for game in date_block.get("games", []):
             teams = game.get("teams", {})
-            for side in ("home", "away"):
-                team = teams.get(side, {}).get("team")
-                if team and team.get("id") == team_id:
-                    opponent_side = "away" if side == "home" else "home"
-                    opponent_team = teams.get(opponent_side, {}).get("team", {})
-                    return {
-                        "opponent": opponent_team.get("name", ""),
-                        "startTime": game.get("gameDate", ""),
-                    }
-    return None
+            home = teams.get("home", {}).get("team")
+            away = teams.get("away", {}).get("team")
+            start_time = game.get("gameDate", "")
+            if home:
+                by_team.setdefault(
+                    home.get("id"),
+                    ScheduledGame((away or {}).get("name", ""), start_time),
+                )
+            if away:
+                by_team.setdefault(
+                    away.get("id"),
+                    ScheduledGame((home or {}).get("name", ""), start_time),
+                )
+    return by_team
+
+
+def _evaluate_one(
+    player: PlayerBaseline,
+    current_season: str,
+    today: date,
+    league_schedule: Future[Dict[int, List[date]]],
+    team_to_game: Dict[int, ScheduledGame],
+) -> Optional[PlayerDueStatus]:
+    """Run the gamelog-to-verdict pipeline for one player on a worker thread."""
+    game_log = fetch_player_gamelog(player.player_id, current_season)
+    last_goal = last_goal_date(game_log)
+    if not last_goal:
+        return None
+    # The league schedule is already bucketed by team; only fall back to
+    # parsing the player's own game dates when the team has no entry.
+    schedule_dates = league_schedule.result().get(player.team_id)
+    if not schedule_dates:
+        schedule_dates = games_played_dates(game_log)
+    avg_days = average_days_between_games(schedule_dates)
+    if avg_days == 0:
+        return None
+    expected_days = (1 / player.goals_per_game) * avg_days
+    days_since_goal = (today - last_goal).days
+    if days_since_goal <= expected_days:
+        return None
+    next_game = team_to_game.get(player.team_id)
+    if not next_game:
+        return None
+    return PlayerDueStatus(
+        player=player,
+        last_goal_date=last_goal,
+        days_since_last_goal=days_since_goal,
+        expected_days_between_goals=expected_days,
+        next_game_opponent=next_game.opponent,
+        next_game_start_time=next_game.start_time,
+    )
 
 
 def evaluate_due_players(today: Optional[date] = None) -> List[PlayerDueStatus]:
     today = today or date.today()
     current_season = get_current_season_id()
     previous_season = get_previous_season_id(current_season)
-    season_dates = get_season_dates(current_season)
-    season_start = _parse_date(season_dates["regularSeasonStart"])
-
-    schedule_today = fetch_schedule_for_day(today)
-    teams_playing_today = set()
-    for date_block in schedule_today.get("dates", []):
-        for game in date_block.get("games", []):
-            for side in ("home", "away"):
-                team = game.get("teams", {}).get(side, {}).get("team")
-                if team:
-                    teams_playing_today.add(team.get("id"))
-
-    baselines = [
-        player
-        for player in fetch_top_goal_scorers(previous_season)
-        if player.team_id in teams_playing_today
-    ]
+    # Issue requests as soon as their inputs are known so they overlap on
+    # the wire. The skater summary only needs the season id, so it streams
+    # in while today's schedule is being indexed.
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        top_scorers = executor.submit(fetch_top_goal_scorers, previous_season)
+        season_dates = executor.submit(get_season_dates, current_season)
+        schedule_today = executor.submit(fetch_schedule_for_day, today)
+
+        season_start = _parse_date(season_dates.result()["regularSeasonStart"])
+        # One league-wide query covers every team's season-to-date games.
+        # It is queued ahead of the per-player work, so workers that wait
+        # on it never starve it of a thread.
+        league_schedule = executor.submit(
+            fetch_league_schedule_for_range, season_start, today
+        )
 
-    due_players: List[PlayerDueStatus] = []
-    for player in baselines:
-        game_log = fetch_player_gamelog(player.player_id, current_season)
-        last_goal = last_goal_date(game_log)
-        if not last_goal:
-            continue
-        played_dates = games_played_dates(game_log)
-        team_schedule = fetch_schedule_for_range(player.team_id, season_start, today)
-        schedule_dates = _extract_schedule_dates(team_schedule)
-        avg_days = average_days_between_games(schedule_dates or played_dates)
-        if avg_days == 0:
-            continue
-        if player.goals_per_game == 0:
-            continue
-        expected_days = (1 / player.goals_per_game) * avg_days
-        days_since_goal = (today - last_goal).days
-        if days_since_goal <= expected_days:
-            continue
-        next_game = _next_game_for_team(schedule_today, player.team_id)
-        if not next_game:
-            continue
-        due_players.append(
-            PlayerDueStatus(
-                player=player,
-                last_goal_date=last_goal,
-                days_since_last_goal=days_since_goal,
-                expected_days_between_goals=expected_days,
-                next_game_opponent=next_game["opponent"],
-                next_game_start_time=next_game["startTime"],
+        team_to_game = _index_games_by_team(schedule_today.result())
+
+        # Drop anyone who cannot be due before spending a request on them.
+        baselines = [
+            player
+            for player in top_scorers.result()
+            if player.team_id in team_to_game and player.goals_per_game > 0
+        ]
+        results = list(
+            executor.map(
+                lambda player: _evaluate_one(
+                    player, current_season, today, league_schedule, team_to_game
+                ),
+                baselines,
             )
         )
-    return due_players
+
+    return [status for status in results if status is not None]
 
 
 def format_due_players(due_players: List[PlayerDueStatus]) -> str:
@@ -236,15 +391,13 @@ def format_due_players(due_players: List[PlayerDueStatus]) -> str:
         "Player | Team | Days Since Last Goal | Expected Days | Opponent | Game Time",
         "------ | ---- | -------------------- | ------------- | -------- | ---------",
     ]
-    for entry in due_players:
-        lines.append(
-            (
-                f"{entry.player.name} | {entry.player.team_abbrev} | "
-                f"{entry.days_since_last_goal} | "
-                f"{entry.expected_days_between_goals:.1f} | "
-                f"{entry.next_game_opponent} | {entry.next_game_start_time}"
-            )
-        )
+    lines.extend(
+        f"{entry.player.name} | {entry.player.team_abbrev} | "
+        f"{entry.days_since_last_goal} | "
+        f"{entry.expected_days_between_goals:.1f} | "
+        f"{entry.next_game_opponent} | {entry.next_game_start_time}"
+        for entry in due_players
+    )
     return "\n".join(lines)
 
 